@@ -13,18 +13,468 @@ Contents
 
 ## Packages
 import os
+import functools
+import fractions
+import concurrent.futures
+import warnings
 import numpy as np
 import pandas as pd
+import matplotlib
 import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from PIL import Image
 ## Local Packages
 import spaceweather.visualisation.static as svg
 import spaceweather.visualisation.heatmaps as svh
 
 
+def _prepare_gif_paths(filepath, filename, save_pngs=False):
+    '''
+    Check the file name for a gif and make the folders for it.
+
+    Parameters
+    ----------
+    filepath : str
+        File path for storing the image files and gif.
+    filename : str
+        File name for the gif, without file extension.
+    save_pngs : bool, optional
+        Whether or not to make the folder for the png image files. Default is False.
+
+    Returns
+    -------
+    gif_name : str
+        File name for the gif, including file path and extension.
+    im_filepath : str
+        File path for storing the png image files.
+    '''
+
+    # check filename
+    if '.' in filename:
+        if len(filename) > 4:
+            filename = filename[:-4] # remove file extension
+        else:
+            raise ValueError('Error: please input filename without file extension')
+
+    # check filepaths; makedirs also makes filepath as the parent of im_filepath
+    im_filepath = filepath + '/images_for_giffing'
+    os.makedirs(im_filepath if save_pngs else filepath, exist_ok = True)
+
+    return filepath + '/%s.gif' %filename, im_filepath
+
+
+def _drop_bbox_inches(kwargs):
+    '''
+    Remove bbox_inches from keyword arguments meant for the frames of a gif,
+    warning if it was given; bbox_inches='tight' makes matplotlib draw every
+    frame twice.
+
+    Parameters
+    ----------
+    kwargs : dict
+        Keyword arguments for plotting or saving the frames.
+
+    Returns
+    -------
+    dict
+        kwargs without bbox_inches.
+    '''
+
+    if kwargs is None or 'bbox_inches' not in kwargs:
+        return kwargs
+
+    warnings.warn("bbox_inches is ignored for gif frames as it makes matplotlib draw each frame twice; size the plot with fig.subplots_adjust or constrained_layout=True instead")
+
+    return {k: v for k, v in kwargs.items() if k != 'bbox_inches'}
+
+
+def _init_worker():
+    '''
+    Set up a worker process for rendering frames; frames are only ever saved
+    to file so the non-interactive Agg backend is used.
+    '''
+
+    matplotlib.use('Agg')
+
+
+def _render_frames(indices, plot_frame, reuse_fig, im_filepath, save_pngs,
+                   savefig_kwargs):
+    '''
+    Render a run of consecutive frames of an animation.
+
+    Parameters
+    ----------
+    indices : range
+        Indices of the frames to be rendered.
+    plot_frame : function
+        Function plot_frame(i, ax, artists) returning the figure for frame i,
+        with its kwargs already bound by :func:`_render_gif`; ax and artists
+        are as in :func:`spaceweather.visualisation.static.plot_data_globe`.
+    reuse_fig : bool
+        Whether or not to draw every frame on the one figure, only updating the
+        time-varying artists, rather than making a new figure for each frame.
+    im_filepath : str
+        File path for storing the png image files.
+    save_pngs : bool
+        Whether or not to also save each frame as a png image file.
+    savefig_kwargs : dict
+        Keyword arguments for fig.savefig when saving the png image files.
+        If it only has pil_kwargs then the frames already in memory are
+        written by PIL in background threads, while the next frame is drawn.
+
+    Returns
+    -------
+    list
+        The frames as PIL.Image.Image, in frame order.
+    '''
+
+    # anything other than pil_kwargs needs savefig to draw the frame again
+    write_in_background = save_pngs and set(savefig_kwargs) <= {'pil_kwargs'}
+
+    images = []
+    fig = None
+    artists = {} if reuse_fig else None
+    with concurrent.futures.ThreadPoolExecutor(max_workers = 2) as png_writer:
+        written = []
+        try:
+            for i in indices:
+                ax = fig.axes[0] if reuse_fig and fig is not None else None
+                open_figs = set(plt.get_fignums())
+                try:
+                    fig = plot_frame(i, ax = ax, artists = artists)
+                except Exception:
+                    # close any figure plot_frame made before failing, as it never returned it
+                    for num in set(plt.get_fignums()) - open_figs:
+                        plt.close(num)
+                    raise
+                if type(fig.canvas) is not FigureCanvasAgg:
+                    # draw with plain Agg, skipping any interactive backend's extra work
+                    FigureCanvasAgg(fig)
+                img = _fig_to_image(fig)
+                images.append(img)
+                im_name = im_filepath + '/%s.png' %i
+                if write_in_background:
+                    written.append(png_writer.submit(img.save, im_name,
+                                                     **savefig_kwargs.get('pil_kwargs', {})))
+                elif save_pngs:
+                    fig.savefig(im_name, **savefig_kwargs) # save image file
+                if not reuse_fig:
+                    plt.close(fig) # pyplot keeps every figure otherwise
+        finally:
+            # close the last figure even if a frame fails, so pyplot lets go of it
+            if fig is not None:
+                plt.close(fig)
+
+        # wait for the png image files, raising any errors from writing them
+        for w in written:
+            w.result()
+
+    return images
+
+
+def _map_frames(plot_frame, frames, reuse_fig=False, im_filepath=None,
+                save_pngs=False, savefig_kwargs=None, max_workers=1):
+    '''
+    Render each frame of an animation, farming runs of frames out to worker processes.
+
+    Parameters
+    ----------
+    plot_frame : function
+        Function plot_frame(i, ax, artists) returning the figure for frame i,
+        with its kwargs already bound by :func:`_render_gif`. Must be picklable,
+        so should be a functools.partial of a module-level function.
+    frames : range
+        Indices of the frames to be rendered.
+    reuse_fig : bool, optional
+        Whether or not each worker draws all its frames on the one figure.
+        Default is False.
+    im_filepath : str, optional
+        File path for storing the png image files.
+    save_pngs : bool, optional
+        Whether or not to also save each frame as a png image file. Default is False.
+    savefig_kwargs : dict, optional
+        Keyword arguments for fig.savefig when saving the png image files.
+        Defaults to the fastest png compression level.
+    max_workers : int, optional
+        Number of worker processes; None uses all the CPUs. Default is 1,
+        rendering the frames in the current process.
+
+    Returns
+    -------
+    list
+        The frames as PIL.Image.Image, in frame order.
+    '''
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if savefig_kwargs is None:
+        # the png image files are only intermediates, so favour speed over size
+        savefig_kwargs = {'pil_kwargs': {'compress_level': 1}}
+    savefig_kwargs = _drop_bbox_inches(savefig_kwargs)
+    render = functools.partial(_render_frames,
+                               plot_frame = plot_frame,
+                               reuse_fig = reuse_fig,
+                               im_filepath = im_filepath,
+                               save_pngs = save_pngs,
+                               savefig_kwargs = savefig_kwargs)
+
+    # render in this process; avoids the cost of starting worker processes
+    if max_workers == 1 or len(frames) < 2:
+        return render(frames)
+
+    # give each worker one run of consecutive frames, so only one figure is set up per worker
+    num_runs = min(max_workers, len(frames))
+    bounds = np.linspace(0, len(frames), num_runs+1).astype(int)
+    runs = [frames[bounds[k]:bounds[k+1]] for k in range(num_runs)]
+    with concurrent.futures.ProcessPoolExecutor(max_workers = num_runs,
+                                                initializer = _init_worker) as executor:
+        return [img for run in executor.map(render, runs) for img in run]
+
+
+def _fig_to_image(fig):
+    '''
+    Rasterise a figure straight into an in-memory image, skipping any file encoding.
+
+    Parameters
+    ----------
+    fig : matplotlib.figure.Figure
+        The figure to be rasterised.
+
+    Returns
+    -------
+    PIL.Image.Image
+        RGBA image of the figure.
+    '''
+
+    fig.canvas.draw()
+    buf = np.asarray(fig.canvas.buffer_rgba())
+    img = Image.frombuffer('RGBA', (buf.shape[1], buf.shape[0]), buf,
+                           'raw', 'RGBA', 0, 1)
+
+    # copy since the canvas buffer is redrawn for the next frame and freed
+    # with the figure; the copy is fully loaded and owns its pixels
+    return img.copy()
+
+
+def _save_gif(images, gif_name, duration=100, writer='pil'):
+    '''
+    Save frames as a gif animation, using one palette shared by every frame.
+
+    Quantizing once up front stops PIL building and optimising an adaptive
+    palette for each frame in turn; only the 'pil' writer can use it.
+
+    Parameters
+    ----------
+    images : list
+        The frames as PIL.Image.Image.
+    gif_name : str
+        File name for the gif, including file path and extension.
+    duration : int, optional
+        Display time of each frame in milliseconds. Default is 100.
+    writer : {'pil', 'imageio', 'ffmpeg'}, optional
+        How to encode the animation. 'pil' uses PIL directly; 'imageio' uses
+        imageio's pillow plugin; 'ffmpeg' saves an mp4 video instead of a gif,
+        with the same name otherwise, using imageio's pyav plugin.
+        'imageio' and 'ffmpeg' need imageio (and pyav for 'ffmpeg') installed;
+        see :func:`_check_writer`. Default is 'pil'.
+    '''
+
+    # video encoders do their own colour handling, so skip the palette
+    if writer == 'ffmpeg':
+        import imageio.v3 as iio
+        frames = np.stack([np.asarray(im.convert('RGB')) for im in images])
+        # exact frame rate, as pyav needs a rational one
+        iio.imwrite(gif_name[:-4] + '.mp4', frames, plugin = 'pyav',
+                    codec = 'libx264', fps = fractions.Fraction(1000, duration))
+        return
+
+    # imageio only takes arrays, which cannot carry a palette, so it quantizes the frames itself
+    if writer == 'imageio':
+        import imageio.v3 as iio
+        frames = np.stack([np.asarray(im.convert('RGB')) for im in images])
+        iio.imwrite(gif_name, frames, plugin = 'pillow',
+                    duration = duration, loop = 0)
+        return
+
+    # build the palette from a montage of frames spread through the animation,
+    # so colours that only appear later still get a palette entry; each frame is
+    # halved with nearest neighbours to keep its colours without blending them
+    sample = images[::max(1, len(images)//16)][:16]
+    cols = int(np.ceil(np.sqrt(len(sample))))
+    rows = int(np.ceil(len(sample)/cols))
+    w, h = max(1, images[0].width//2), max(1, images[0].height//2)
+    montage = Image.new('RGB', (cols*w, rows*h))
+    for k, im in enumerate(sample):
+        tile = im.convert('RGB').resize((w, h), Image.Resampling.NEAREST)
+        montage.paste(tile, ((k % cols)*w, (k // cols)*h))
+    palette = montage.quantize(colors = 256, method = Image.Quantize.FASTOCTREE)
+
+    # map every frame onto the palette
+    frames = [im.convert('RGB').quantize(palette = palette,
+                                         dither = Image.Dither.NONE)
+              for im in images]
+    frames[0].save(gif_name,
+                   save_all = True,
+                   append_images = frames[1:],
+                   duration = duration, loop = 0,
+                   optimize = False, disposal = 2)
+
+
+def _check_writer(writer):
+    '''
+    Check the writer for a gif before any frames are rendered, so a bad
+    writer or a missing imageio fails straight away.
+
+    Parameters
+    ----------
+    writer : {'pil', 'imageio', 'ffmpeg'}
+        How to encode the animation; as in :func:`_save_gif`.
+    '''
+
+    if writer not in ('pil', 'imageio', 'ffmpeg'):
+        raise ValueError("Error: writer must be one of 'pil', 'imageio' or 'ffmpeg'")
+
+    # imageio is only needed by these writers, so only import it for them
+    if writer != 'pil':
+        import imageio.v3
+
+
+def _render_gif(ds, plot_frame, frame_coord, filepath, filename,
+                stride=1, frame_limit=None, reuse_fig=False, max_workers=1,
+                save_pngs=False, savefig_kwargs=None, writer='pil', **kwargs):
+    '''
+    Render each frame of an animation and save it as a gif; shared by all the
+    gif functions in this module.
+
+    Parameters
+    ----------
+    ds : xarray.Dataset
+        Dataset being animated.
+    plot_frame : function
+        Function plot_frame(i, ax, artists, kwargs) returning the figure for
+        frame i. Must be picklable, so should be a functools.partial of a
+        module-level function. kwargs is bound here to **kwargs below, so
+        the frames are then plotted with plot_frame(i, ax, artists).
+    frame_coord : str
+        Coordinate of ds to animate over; there is one frame for each of its values.
+    filepath : str
+        File path for storing the image files and gif.
+    filename : str
+        File name for the gif, without file extension.
+    stride, frame_limit, reuse_fig, max_workers, save_pngs, savefig_kwargs, writer
+        As in :func:`data_globe_gif`.
+    **kwargs
+        Keyword arguments for plotting each frame.
+
+    Returns
+    -------
+    .png
+        png image files used to make the gif animation, saved in
+        filepath/images_for_giffing; only if save_pngs is True.
+    .gif
+        gif animation of the frames, saved in filepath; an .mp4 video instead
+        if writer is 'ffmpeg'.
+    '''
+
+    # check inputs
+    if stride < 1:
+        raise ValueError('Error: stride must be at least 1')
+    if frame_limit is not None and frame_limit < 1:
+        raise ValueError('Error: frame_limit must be at least 1')
+
+    # check writer, filename and filepaths
+    _check_writer(writer)
+    gif_name, im_filepath = _prepare_gif_paths(filepath, filename, save_pngs)
+    plot_frame = functools.partial(plot_frame, kwargs = _drop_bbox_inches(kwargs))
+
+    # plot every stride-th frame, up to frame_limit of them
+    frames = range(0, ds.sizes[frame_coord], stride)[:frame_limit]
+    images = _map_frames(plot_frame, frames, reuse_fig,
+                         im_filepath, save_pngs, savefig_kwargs, max_workers)
+
+    # make gif file and save it in filepath; longer frames keep the playback speed
+    _save_gif(images, gif_name, duration = 100*stride, writer = writer)
+
+
+def _plot_data_frame(i, ax, artists, lats, longs, v, u, times, ortho_trans,
+                     daynight, colour, scene_cache, kwargs):
+    '''
+    Plot frame i of :func:`data_globe_gif`; v and u are numpy.ndarray whose
+    axes are time, station.
+    '''
+
+    return svg.plot_data_globe_fast(lats, longs, v[i], u[i], times[i],
+                                    ortho_trans = ortho_trans,
+                                    daynight = daynight,
+                                    colour = colour,
+                                    scene_cache = scene_cache,
+                                    ax = ax,
+                                    artists = artists,
+                                    **kwargs)
+
+
+def _plot_connections_frame(i, ax, artists, adj_coeffs, list_of_stations,
+                            list_of_win_start, ortho_trans, daynight, scene_cache,
+                            kwargs):
+    '''
+    Plot frame i of :func:`connections_globe_gif`; adj_coeffs is a numpy.ndarray
+    whose first axis is win_start.
+    '''
+
+    return svg.plot_connections_globe(adj_matrix = adj_coeffs[i],
+                                      list_of_stations = list_of_stations,
+                                      time = list_of_win_start[i],
+                                      ortho_trans = ortho_trans,
+                                      daynight = daynight,
+                                      scene_cache = scene_cache,
+                                      ax = ax,
+                                      artists = artists,
+                                      **kwargs)
+
+
+def _plot_lag_mat_frame(i, ax, artists, lag_ds, kwargs):
+    '''
+    Plot frame i of :func:`lag_mat_gif_time`; always a new figure since the
+    colour scale is fitted to each frame.
+    '''
+
+    lm = lag_ds[dict(time_win = i, lag = 0, win_start = i)]
+    return svh.plot_lag_mat_time(lag_mat = lm, **kwargs)
+
+
+def _plot_lag_network_frame(i, ax, artists, adj_matrix_ds, kwargs):
+    '''
+    Plot frame i of :func:`lag_network_gif`; always a new figure since the
+    Basemap plot cannot be updated in place.
+    '''
+
+    am = adj_matrix_ds[dict(win_start = i)]
+    return svg.plot_lag_network(adj_matrix = am, **kwargs)
+
+
+def _plot_corr_thresh_frame(i, ax, artists, corr_thresh_ds, kwargs):
+    '''
+    Plot frame i of :func:`corr_thresh_gif`.
+    '''
+
+    clm = corr_thresh_ds[dict(win_start = i)]
+    return svh.plot_corr_thresh(corr_lag_mat = clm, ax = ax, artists = artists, **kwargs)
+
+
+def _plot_cca_ang_frame(i, ax, artists, cca_ang_ds, a_b, kwargs):
+    '''
+    Plot frame i of :func:`cca_ang_gif`.
+    '''
+
+    cam = cca_ang_ds[dict(time = i)]
+    return svh.plot_cca_ang(cca_ang = cam, a_b = a_b, ax = ax, artists = artists, **kwargs)
+
+
 def data_globe_gif(ds, filepath='data_gif', filename='globe_data',
                    list_of_stations=None, list_of_components=['N', 'E'],
-                   ortho_trans=None, daynight=True, colour=False, **kwargs):
+                   ortho_trans=None, daynight=True, colour=False,
+                   stride=1, frame_limit=None, reuse_fig=True, max_workers=1,
+                   save_pngs=False, savefig_kwargs=None, writer='pil', **kwargs):
     '''
     Animates the data vectors on a globe over time with an optional shadow for
     nighttime and optional data colouration.
@@ -50,72 +500,86 @@ def data_globe_gif(ds, filepath='data_gif', filename='globe_data',
     colour : bool, optional
         Whether or not to colour the data vectors. Also accepts 'color' for
         Americans who can't spell properly.
+    stride : int, optional
+        Only plot every stride-th frame, eg for a quick preview; each frame is
+        shown for longer so the gif plays at the same speed. Default is 1.
+    frame_limit : int, optional
+        Maximum number of frames to plot. Default is no limit.
+    reuse_fig : bool, optional
+        Whether or not to draw every frame on the one figure, only updating what
+        changes over time, rather than making a new figure for each frame. Default is True.
+    max_workers : int, optional
+        Number of processes used to render the frames; None uses all the CPUs.
+        Default is 1, rendering the frames in the current process. Scripts
+        using more than 1 must guard their top-level code with
+        ``if __name__ == '__main__':``, as the worker processes may import them.
+    save_pngs : bool, optional
+        Whether or not to also save each frame as a png image file. Default is False.
+    savefig_kwargs : dict, optional
+        Keyword arguments for fig.savefig when saving the png image files.
+        Default is {'pil_kwargs': {'compress_level': 1}}, as the fastest png
+        compression. Avoid bbox_inches='tight', which draws each frame twice.
+    writer : {'pil', 'imageio', 'ffmpeg'}, optional
+        How to encode the animation; 'ffmpeg' saves an mp4 video rather than
+        a gif. 'imageio' and 'ffmpeg' need imageio installed. Default is 'pil'.
+    **kwargs
+        Passed on to :func:`spaceweather.visualisation.static.plot_data_globe_fast`;
+        eg quality='preview' for a quicker, lower resolution globe.
 
     Returns
     -------
     .png
-        png image files used to make the gif animation, saved in filepath/images_for_giffing.
+        png image files used to make the gif animation, saved in
+        filepath/images_for_giffing; only if save_pngs is True.
     .gif
-        gif animation of the png image files, saved in filepath/gif.
+        gif animation of the frames, saved in filepath; an .mp4 video instead
+        if writer is 'ffmpeg'.
     '''
 
-    # check filepaths
-    if not os.path.exists(filepath):
-        os.makedirs(filepath)
-
-    im_filepath = filepath + '/images_for_giffing'
-    if not os.path.exists(im_filepath):
-        os.makedirs(im_filepath)
-
-    # check filename
-    if '.' in filename:
-        if len(filename) > 4:
-            filename = filename[:-4] # remove file extension
-        else:
-            raise ValueError('Error: please input filename without file extension')
+    # check inputs
+    if len(list_of_components) != 2:
+        raise ValueError('Error: please input two components in list_of_components')
 
     # get contstants
     if list_of_stations is None:
         list_of_stations = ds.station.values
-    list_of_times = ds.time.values
-    num_times = len(list_of_times)
 
     # check ortho_trans
     if ortho_trans is None:
         ortho_trans = svg.auto_ortho(list_of_stations)
 
-    # initialize the list of names of image files
-    names = []
+    # work out the parts of the globe that are the same for every frame
+    scene_cache = svg.build_globe_scene(ortho_trans, list_of_stations)
 
-    # plot the data vectors for each time in the Dataset
-    for i in range(num_times):
-        fig = svg.plot_data_globe(ds = ds,
-                                  list_of_stations = list_of_stations,
-                                  list_of_components = list_of_components,
-                                  t = i,
-                                  ortho_trans = ortho_trans,
-                                  daynight = daynight,
-                                  colour = colour,
-                                  **kwargs)
-        im_name = im_filepath + '/%s.png' %i
-        fig.savefig(im_name) # save image file
-        names.append(im_name) # add name of image file to list
-
-    # append plots to each other
-    images = []
-    for n in names:
-        images.append(Image.open(n))
+    # take the measurements out of the Dataset once, rather than indexing it for each frame
+    measurements = ds.measurements.loc[dict(station = list_of_stations)]
+    v = measurements.loc[dict(component = list_of_components[0])].transpose('time', 'station').values
+    u = measurements.loc[dict(component = list_of_components[1])].transpose('time', 'station').values
 
-    # make gif file and save it in filepath
-    images[0].save(filepath + '/%s.gif' %filename,
-                   save_all = True,
-                   append_images = images[1:],
-                   duration = 100, loop = 0)
+    # plot the data vectors for each time in the Dataset
+    plot_frame = functools.partial(_plot_data_frame,
+                                   lats = scene_cache['latitude'].astype(np.float64),
+                                   longs = scene_cache['longitude'].astype(np.float64),
+                                   v = v,
+                                   u = u,
+                                   times = ds.time.values,
+                                   ortho_trans = ortho_trans,
+                                   daynight = daynight,
+                                   colour = colour,
+                                   scene_cache = scene_cache)
+    _render_gif(ds, plot_frame, 'time', filepath, filename,
+                stride = stride, frame_limit = frame_limit,
+                reuse_fig = reuse_fig, max_workers = max_workers,
+                save_pngs = save_pngs, savefig_kwargs = savefig_kwargs,
+                writer = writer, **kwargs)
 
 
 def connections_globe_gif(adj_mat_ds,
                           filepath='connections_gif', filename='globe_conn',
-                          ortho_trans=None, daynight=True, **kwargs):
+                          ortho_trans=None, daynight=True,
+                          stride=1, frame_limit=None, reuse_fig=True,
+                          max_workers=1, save_pngs=False, savefig_kwargs=None,
+                          writer='pil', **kwargs):
     '''
     Animates the network on a globe over time with an optional shadow for nighttime.
 
@@ -133,69 +597,75 @@ def connections_globe_gif(adj_mat_ds,
         Defaults to average location of all stations.
     daynight : bool, optional
         Whether or not to include a shadow for nighttime. Default is True.
+    stride : int, optional
+        Only plot every stride-th frame, eg for a quick preview; each frame is
+        shown for longer so the gif plays at the same speed. Default is 1.
+    frame_limit : int, optional
+        Maximum number of frames to plot. Default is no limit.
+    reuse_fig : bool, optional
+        Whether or not to draw every frame on the one figure, only updating what
+        changes over time, rather than making a new figure for each frame. Default is True.
+    max_workers : int, optional
+        Number of processes used to render the frames; None uses all the CPUs.
+        Default is 1, rendering the frames in the current process. Scripts
+        using more than 1 must guard their top-level code with
+        ``if __name__ == '__main__':``, as the worker processes may import them.
+    save_pngs : bool, optional
+        Whether or not to also save each frame as a png image file. Default is False.
+    savefig_kwargs : dict, optional
+        Keyword arguments for fig.savefig when saving the png image files.
+        Default is {'pil_kwargs': {'compress_level': 1}}, as the fastest png
+        compression. Avoid bbox_inches='tight', which draws each frame twice.
+    writer : {'pil', 'imageio', 'ffmpeg'}, optional
+        How to encode the animation; 'ffmpeg' saves an mp4 video rather than
+        a gif. 'imageio' and 'ffmpeg' need imageio installed. Default is 'pil'.
+    **kwargs
+        Passed on to :func:`spaceweather.visualisation.static.plot_connections_globe`;
+        eg quality='preview' for a quicker, lower resolution globe.
 
     Returns
     -------
     .png
-        png image files used to make the gif animation, saved in filepath/images_for_giffing.
+        png image files used to make the gif animation, saved in
+        filepath/images_for_giffing; only if save_pngs is True.
     .gif
-        gif animation of the png image files, saved in filepath/gif.
+        gif animation of the frames, saved in filepath; an .mp4 video instead
+        if writer is 'ffmpeg'.
     '''
 
-    # check filepaths
-    if not os.path.exists(filepath):
-        os.makedirs(filepath)
-
-    im_filepath = filepath + '/images_for_giffing'
-    if not os.path.exists(im_filepath):
-        os.makedirs(im_filepath)
-
-    # check filename
-    if '.' in filename:
-        if len(filename) > 4:
-            filename = filename[:-4] # remove file extension
-        else:
-            print('Error: please input filename without file extension')
-            return 'Error: please input filename without file extension'
-
     # get contstants
     list_of_stations = adj_mat_ds.first_st.values
     list_of_win_start = adj_mat_ds.win_start.values
-    num_win = len(list_of_win_start)
+
+    # take the adjacency matrices out of the Dataset once, rather than indexing it for each frame
+    adj_coeffs = adj_mat_ds.adj_coeffs.transpose('win_start', 'first_st', 'second_st').values
 
     # check ortho_trans
     if ortho_trans is None:
         ortho_trans = svg.auto_ortho(list_of_stations)
 
-    # initialize the list of names of image files
-    names = []
+    # work out the parts of the globe that are the same for every frame
+    scene_cache = svg.build_globe_scene(ortho_trans, list_of_stations)
 
     # plot the connections for each win_start value in the adjacency matrix
-    for i in range(num_win):
-        fig = svg.plot_connections_globe(adj_matrix = adj_mat_ds[dict(win_start = i)].adj_coeffs.values,
-                                         list_of_stations = list_of_stations,
-                                         time = list_of_win_start[i],
-                                         ortho_trans = ortho_trans,
-                                         daynight = daynight,
-                                         **kwargs)
-        im_name = im_filepath + '/%s.png' %i
-        fig.savefig(im_name) # save image file
-        names.append(im_name) # add name of image file to list
-
-    # append plots to each other
-    images = []
-    for n in names:
-        images.append(Image.open(n))
-
-    # make gif file and save it in filepath
-    images[0].save(filepath + '/%s.gif' %filename,
-                   save_all = True,
-                   append_images = images[1:],
-                   duration = 100, loop = 0)
+    plot_frame = functools.partial(_plot_connections_frame,
+                                   adj_coeffs = adj_coeffs,
+                                   list_of_stations = list_of_stations,
+                                   list_of_win_start = list_of_win_start,
+                                   ortho_trans = ortho_trans,
+                                   daynight = daynight,
+                                   scene_cache = scene_cache)
+    _render_gif(adj_mat_ds, plot_frame, 'win_start', filepath, filename,
+                stride = stride, frame_limit = frame_limit,
+                reuse_fig = reuse_fig, max_workers = max_workers,
+                save_pngs = save_pngs, savefig_kwargs = savefig_kwargs,
+                writer = writer, **kwargs)
 
 
 def lag_mat_gif_time(lag_ds, filepath='lag_mat_gif',
-                     filename='lag_mat', **kwargs):
+                     filename='lag_mat', stride=1, frame_limit=None,
+                     max_workers=1, save_pngs=False, savefig_kwargs=None,
+                     writer='pil', **kwargs):
     '''
     Animates a correlogram over time for a station pair.
 
@@ -208,59 +678,49 @@ def lag_mat_gif_time(lag_ds, filepath='lag_mat_gif',
         'lag_mat_gif' folder to be made in the current working directory.
     filename : str, optional
         File name for the gif, without file extension. Default is 'lag_mat'.
+    stride : int, optional
+        Only plot every stride-th frame, eg for a quick preview; each frame is
+        shown for longer so the gif plays at the same speed. Default is 1.
+    frame_limit : int, optional
+        Maximum number of frames to plot. Default is no limit.
+    max_workers : int, optional
+        Number of processes used to render the frames; None uses all the CPUs.
+        Default is 1, rendering the frames in the current process. Scripts
+        using more than 1 must guard their top-level code with
+        ``if __name__ == '__main__':``, as the worker processes may import them.
+    save_pngs : bool, optional
+        Whether or not to also save each frame as a png image file. Default is False.
+    savefig_kwargs : dict, optional
+        Keyword arguments for fig.savefig when saving the png image files.
+        Default is {'pil_kwargs': {'compress_level': 1}}, as the fastest png
+        compression. Avoid bbox_inches='tight', which draws each frame twice.
+    writer : {'pil', 'imageio', 'ffmpeg'}, optional
+        How to encode the animation; 'ffmpeg' saves an mp4 video rather than
+        a gif. 'imageio' and 'ffmpeg' need imageio installed. Default is 'pil'.
 
     Returns
     -------
     .png
-        png image files used to make the gif animation, saved in filepath/images_for_giffing.
+        png image files used to make the gif animation, saved in
+        filepath/images_for_giffing; only if save_pngs is True.
     .gif
-        gif animation of the png image files, saved in filepath/gif.
+        gif animation of the frames, saved in filepath; an .mp4 video instead
+        if writer is 'ffmpeg'.
     '''
 
-    # check filepaths
-    if not os.path.exists(filepath):
-        os.makedirs(filepath)
-
-    im_filepath = filepath + '/images_for_giffing'
-    if not os.path.exists(im_filepath):
-        os.makedirs(im_filepath)
-
-    # check filename
-    if '.' in filename:
-        if len(filename) > 4:
-            filename = filename[:-4] # remove file extension
-        else:
-            raise ValueError('Error: please input filename without file extension')
-
-    # get constants
-    time_wins = lag_ds.time_win.values
-    num_win = len(time_wins)
-
-    # initialize the list of names of image files
-    names = []
-
-    # plot the connections for each win_start value in the adjacency matrix
-    for i in range(num_win):
-        lm = lag_ds[dict(time_win = i, lag = 0, win_start = i)]
-        fig = svh.plot_lag_mat_time(lag_mat = lm, **kwargs)
-        im_name = im_filepath + '/%s.png' %i
-        fig.savefig(im_name) # save image file
-        names.append(im_name) # add name of image file to list
-
-    # append plots to each other
-    images = []
-    for n in names:
-        images.append(Image.open(n))
-
-    # make gif file and save it in filepath
-    images[0].save(filepath + '/%s.gif' %filename,
-                   save_all = True,
-                   append_images = images[1:],
-                   duration = 100, loop = 0)
+    # plot the correlations for each time window
+    plot_frame = functools.partial(_plot_lag_mat_frame, lag_ds = lag_ds)
+    _render_gif(lag_ds, plot_frame, 'time_win', filepath, filename,
+                stride = stride, frame_limit = frame_limit,
+                max_workers = max_workers, save_pngs = save_pngs,
+                savefig_kwargs = savefig_kwargs, writer = writer,
+                **kwargs)
 
 
 def lag_network_gif(adj_matrix_ds, filepath='lag_network_gif',
-                    filename='lag_network', **kwargs):
+                    filename='lag_network', stride=1, frame_limit=None,
+                    max_workers=1, save_pngs=False, savefig_kwargs=None,
+                    writer='pil', **kwargs):
     '''
     Animate the directed network provided by the adjacency matrix and lag over time.
 
@@ -273,59 +733,49 @@ def lag_network_gif(adj_matrix_ds, filepath='lag_network_gif',
         'lag_network_gif' folder to be made in the current working directory.
     filename : str, optional
         File name for the gif, without file extension. Default is 'lag_network'.
+    stride : int, optional
+        Only plot every stride-th frame, eg for a quick preview; each frame is
+        shown for longer so the gif plays at the same speed. Default is 1.
+    frame_limit : int, optional
+        Maximum number of frames to plot. Default is no limit.
+    max_workers : int, optional
+        Number of processes used to render the frames; None uses all the CPUs.
+        Default is 1, rendering the frames in the current process. Scripts
+        using more than 1 must guard their top-level code with
+        ``if __name__ == '__main__':``, as the worker processes may import them.
+    save_pngs : bool, optional
+        Whether or not to also save each frame as a png image file. Default is False.
+    savefig_kwargs : dict, optional
+        Keyword arguments for fig.savefig when saving the png image files.
+        Default is {'pil_kwargs': {'compress_level': 1}}, as the fastest png
+        compression. Avoid bbox_inches='tight', which draws each frame twice.
+    writer : {'pil', 'imageio', 'ffmpeg'}, optional
+        How to encode the animation; 'ffmpeg' saves an mp4 video rather than
+        a gif. 'imageio' and 'ffmpeg' need imageio installed. Default is 'pil'.
 
     Returns
     -------
     .png
-        png image files used to make the gif animation, saved in filepath/images_for_giffing.
+        png image files used to make the gif animation, saved in
+        filepath/images_for_giffing; only if save_pngs is True.
     .gif
-        gif animation of the png image files, saved in filepath/gif.
+        gif animation of the frames, saved in filepath; an .mp4 video instead
+        if writer is 'ffmpeg'.
     '''
 
-    # check filepaths
-    if not os.path.exists(filepath):
-        os.makedirs(filepath)
-
-    im_filepath = filepath + '/images_for_giffing'
-    if not os.path.exists(im_filepath):
-        os.makedirs(im_filepath)
-
-    # check filename
-    if '.' in filename:
-        if len(filename) > 4:
-            filename = filename[:-4] # remove file extension
-        else:
-            raise ValueError('Error: please input filename without file extension')
-
-    # get constants
-    w_sts = adj_matrix_ds.win_start.values
-    num_win = len(w_sts)
-
-    # initialize the list of names of image files
-    names = []
-
     # plot the connections for each win_start value in the adjacency matrix
-    for i in range(num_win):
-        am = adj_matrix_ds[dict(win_start = i)]
-        fig = svg.plot_lag_network(adj_matrix = am, **kwargs)
-        im_name = im_filepath + '/%s.png' %i
-        fig.savefig(im_name) # save image file
-        names.append(im_name) # add name of image file to list
-
-    # append plots to each other
-    images = []
-    for n in names:
-        images.append(Image.open(n))
-
-    # make gif file and save it in filepath
-    images[0].save(filepath + '/%s.gif' %filename,
-                   save_all = True,
-                   append_images = images[1:],
-                   duration = 100, loop = 0)
+    plot_frame = functools.partial(_plot_lag_network_frame, adj_matrix_ds = adj_matrix_ds)
+    _render_gif(adj_matrix_ds, plot_frame, 'win_start', filepath, filename,
+                stride = stride, frame_limit = frame_limit,
+                max_workers = max_workers, save_pngs = save_pngs,
+                savefig_kwargs = savefig_kwargs, writer = writer,
+                **kwargs)
 
 
 def corr_thresh_gif(corr_thresh_ds, filepath='corr_thresh_gif',
-                    filename='corr_thresh', **kwargs):
+                    filename='corr_thresh', stride=1, frame_limit=None,
+                    reuse_fig=True, max_workers=1, save_pngs=False,
+                    savefig_kwargs=None, writer='pil', **kwargs):
     '''
     Animates a correlation-threshold heatmap over time.
 
@@ -339,59 +789,52 @@ def corr_thresh_gif(corr_thresh_ds, filepath='corr_thresh_gif',
         'corr_thresh_gif' folder to be made in the current working directory.
     filename : str, optional
         File name for the gif, without file extension. Default is 'corr_thresh'.
+    stride : int, optional
+        Only plot every stride-th frame, eg for a quick preview; each frame is
+        shown for longer so the gif plays at the same speed. Default is 1.
+    frame_limit : int, optional
+        Maximum number of frames to plot. Default is no limit.
+    reuse_fig : bool, optional
+        Whether or not to draw every frame on the one figure, only updating what
+        changes over time, rather than making a new figure for each frame. Default is True.
+    max_workers : int, optional
+        Number of processes used to render the frames; None uses all the CPUs.
+        Default is 1, rendering the frames in the current process. Scripts
+        using more than 1 must guard their top-level code with
+        ``if __name__ == '__main__':``, as the worker processes may import them.
+    save_pngs : bool, optional
+        Whether or not to also save each frame as a png image file. Default is False.
+    savefig_kwargs : dict, optional
+        Keyword arguments for fig.savefig when saving the png image files.
+        Default is {'pil_kwargs': {'compress_level': 1}}, as the fastest png
+        compression. Avoid bbox_inches='tight', which draws each frame twice.
+    writer : {'pil', 'imageio', 'ffmpeg'}, optional
+        How to encode the animation; 'ffmpeg' saves an mp4 video rather than
+        a gif. 'imageio' and 'ffmpeg' need imageio installed. Default is 'pil'.
 
     Returns
     -------
     .png
-        png image files used to make the gif animation, saved in filepath/images_for_giffing.
+        png image files used to make the gif animation, saved in
+        filepath/images_for_giffing; only if save_pngs is True.
     .gif
-        gif animation of the png image files, saved in filepath/gif.
+        gif animation of the frames, saved in filepath; an .mp4 video instead
+        if writer is 'ffmpeg'.
     '''
 
-    # check filepaths
-    if not os.path.exists(filepath):
-        os.makedirs(filepath)
-
-    im_filepath = filepath + '/images_for_giffing'
-    if not os.path.exists(im_filepath):
-        os.makedirs(im_filepath)
-
-    # check filename
-    if '.' in filename:
-        if len(filename) > 4:
-            filename = filename[:-4] # remove file extension
-        else:
-            raise ValueError('Error: please input filename without file extension')
-
-    # get constants
-    w_sts = corr_thresh_ds.win_start.values
-    num_win = len(w_sts)
-
-    # initialize the list of names of image files
-    names = []
-
-    # plot the connections for each win_start value in the adjacency matrix
-    for i in range(num_win):
-        clm = corr_thresh_ds[dict(win_start = i)]
-        fig = svh.plot_corr_thresh(corr_lag_mat = clm, **kwargs)
-        im_name = im_filepath + '/%s.png' %i
-        fig.savefig(im_name) # save image file
-        names.append(im_name) # add name of image file to list
-
-    # append plots to each other
-    images = []
-    for n in names:
-        images.append(Image.open(n))
-
-    # make gif file and save it in filepath
-    images[0].save(filepath + '/%s.gif' %filename,
-                   save_all = True,
-                   append_images = images[1:],
-                   duration = 100, loop = 0)
+    # plot the heatmap for each win_start value
+    plot_frame = functools.partial(_plot_corr_thresh_frame, corr_thresh_ds = corr_thresh_ds)
+    _render_gif(corr_thresh_ds, plot_frame, 'win_start', filepath, filename,
+                stride = stride, frame_limit = frame_limit,
+                reuse_fig = reuse_fig, max_workers = max_workers,
+                save_pngs = save_pngs, savefig_kwargs = savefig_kwargs,
+                writer = writer, **kwargs)
 
 
 def cca_ang_gif(cca_ang_ds, a_b, filepath='cca_ang_gif',
-                filename='cca_ang', **kwargs):
+                filename='cca_ang', stride=1, frame_limit=None,
+                reuse_fig=True, max_workers=1, save_pngs=False,
+                savefig_kwargs=None, writer='pil', **kwargs):
     '''
     Animates a CCA angle heatmap over time.
 
@@ -407,52 +850,46 @@ def cca_ang_gif(cca_ang_ds, a_b, filepath='cca_ang_gif',
         'corr_thresh_gif' folder to be made in the current working directory.
     filename : str, optional
         File name for the gif, without file extension. Default is 'corr_thresh'.
+    stride : int, optional
+        Only plot every stride-th frame, eg for a quick preview; each frame is
+        shown for longer so the gif plays at the same speed. Default is 1.
+    frame_limit : int, optional
+        Maximum number of frames to plot. Default is no limit.
+    reuse_fig : bool, optional
+        Whether or not to draw every frame on the one figure, only updating what
+        changes over time, rather than making a new figure for each frame. Default is True.
+    max_workers : int, optional
+        Number of processes used to render the frames; None uses all the CPUs.
+        Default is 1, rendering the frames in the current process. Scripts
+        using more than 1 must guard their top-level code with
+        ``if __name__ == '__main__':``, as the worker processes may import them.
+    save_pngs : bool, optional
+        Whether or not to also save each frame as a png image file. Default is False.
+    savefig_kwargs : dict, optional
+        Keyword arguments for fig.savefig when saving the png image files.
+        Default is {'pil_kwargs': {'compress_level': 1}}, as the fastest png
+        compression. Avoid bbox_inches='tight', which draws each frame twice.
+    writer : {'pil', 'imageio', 'ffmpeg'}, optional
+        How to encode the animation; 'ffmpeg' saves an mp4 video rather than
+        a gif. 'imageio' and 'ffmpeg' need imageio installed. Default is 'pil'.
 
     Returns
     -------
     .png
-        png image files used to make the gif animation, saved in filepath/images_for_giffing.
+        png image files used to make the gif animation, saved in
+        filepath/images_for_giffing; only if save_pngs is True.
     .gif
-        gif animation of the png image files, saved in filepath/gif.
+        gif animation of the frames, saved in filepath; an .mp4 video instead
+        if writer is 'ffmpeg'.
     '''
 
-    # check filepaths
-    if not os.path.exists(filepath):
-        os.makedirs(filepath)
-
-    im_filepath = filepath + '/images_for_giffing'
-    if not os.path.exists(im_filepath):
-        os.makedirs(im_filepath)
-
-    # check filename
-    if '.' in filename:
-        if len(filename) > 4:
-            filename = filename[:-4] # remove file extension
-        else:
-            raise ValueError('Error: please input filename without file extension')
-
-    # get constants
-    times = cca_ang_ds.time.values
-    num_times = len(times)
+    # only keep the weight being plotted, so there is half as much to index and send to workers
+    cca_ang_ds = cca_ang_ds.sel(a_b = [a_b])
 
-    # initialize the list of names of image files
-    names = []
-
-    # plot the connections for each win_start value in the adjacency matrix
-    for i in range(num_times):
-        cam = cca_ang_ds[dict(time = i)]
-        fig = svh.plot_cca_ang(cca_ang = cam, a_b = a_b, **kwargs)
-        im_name = im_filepath + '/%s.png' %i
-        fig.savefig(im_name) # save image file
-        names.append(im_name) # add name of image file to list
-
-    # append plots to each other
-    images = []
-    for n in names:
-        images.append(Image.open(n))
-
-    # make gif file and save it in filepath
-    images[0].save(filepath + '/%s.gif' %filename,
-                   save_all = True,
-                   append_images = images[1:],
-                   duration = 100, loop = 0)
+    # plot the heatmap for each time
+    plot_frame = functools.partial(_plot_cca_ang_frame, cca_ang_ds = cca_ang_ds, a_b = a_b)
+    _render_gif(cca_ang_ds, plot_frame, 'time', filepath, filename,
+                stride = stride, frame_limit = frame_limit,
+                reuse_fig = reuse_fig, max_workers = max_workers,
+                save_pngs = save_pngs, savefig_kwargs = savefig_kwargs,
+                writer = writer, **kwargs)
@@ -151,7 +151,7 @@ def plot_lag_mat_time(lag_mat):
     return fig
 
 
-def plot_corr_thresh(corr_lag_mat):
+def plot_corr_thresh(corr_lag_mat, ax=None, artists=None):
     """
     Plot a heatmap of the threshold subtracted from the correlations between
     each station pair for one time.
@@ -160,6 +160,13 @@ def plot_corr_thresh(corr_lag_mat):
     ----------
     corr_lag_mat : xarray.Dataset
         The values to be plotted; coordinates are 'first_st' and 'second_st'.
+    ax : matplotlib.axes.Axes, optional
+        Axes of an earlier heatmap from this function to update with the new
+        values, rather than making a new figure. Must be given with the artists
+        of that heatmap.
+    artists : dict, optional
+        The time-varying artists of the heatmap. If empty then it is filled with
+        the artists of the new heatmap, ready to be updated by a later call with ax.
 
     Returns
     -------
@@ -173,6 +180,12 @@ def plot_corr_thresh(corr_lag_mat):
     time = pd.to_datetime(corr_lag_mat.win_start.values)
     timestamp = time.strftime('%Y.%m.%d %H:%M')
 
+    # update the time-varying artists of an existing heatmap
+    if ax is not None and artists:
+        artists['mesh'].set_array(np.ma.masked_invalid(corr_lag_mat.corr_thresh.values).ravel())
+        artists['title'].set_text('Correlation Heatmap at %s' %timestamp)
+        return ax.figure
+
     # adjust coordinates for plotting
     corr_lag_mat = corr_lag_mat.assign_coords(first_st = range(num_st),
                                               second_st = range(num_st))
@@ -192,17 +205,21 @@ def plot_corr_thresh(corr_lag_mat):
                                             cmap=newcmap,
                                             norm=norm,
                                             cbar_kwargs={'label': 'Correlation Coefficient - Threshold'})
-    plt.title('Correlation Heatmap at %s' %timestamp, fontsize = 24)
+    title = plt.title('Correlation Heatmap at %s' %timestamp, fontsize = 24)
     plt.xlabel('Station 1', fontsize=20)
     plt.xticks(ticks=range(num_st), labels=stations, rotation=0)
     plt.ylabel('Station 2', fontsize=20)
     plt.yticks(ticks=range(num_st), labels=stations, rotation=0)
     g.figure.axes[-1].yaxis.label.set_size(20)
 
+    # keep hold of the time-varying artists so they can be updated
+    if artists is not None:
+        artists.update(mesh = g, title = title)
+
     return fig
 
 
-def plot_cca_ang(cca_ang, a_b):
+def plot_cca_ang(cca_ang, a_b, ax=None, artists=None):
     """
     Plot a heatmap of the CCA angles for each station pair for one time.
 
@@ -212,6 +229,13 @@ def plot_cca_ang(cca_ang, a_b):
         The values to be plotted; coordinates are 'first_st' and 'second_st'.
     a_b : {'a', 'b'}
         Plot angles for weight 'a' or weight 'b'.
+    ax : matplotlib.axes.Axes, optional
+        Axes of an earlier heatmap from this function to update with the new
+        values, rather than making a new figure. Must be given with the artists
+        of that heatmap.
+    artists : dict, optional
+        The time-varying artists of the heatmap. If empty then it is filled with
+        the artists of the new heatmap, ready to be updated by a later call with ax.
 
     Returns
     -------
@@ -232,17 +256,27 @@ def plot_cca_ang(cca_ang, a_b):
     time_stamp = time.strftime('%Y.%m.%d %H:%M')
     title = 'CCA Angles at ' + time_stamp
 
+    # update the time-varying artists of an existing heatmap
+    if ax is not None and artists:
+        artists['mesh'].set_array(np.ma.masked_invalid(cc.ang_data.values).ravel())
+        artists['title'].set_text(title)
+        return ax.figure
+
     # plot heatmap
     fig = plt.figure(figsize=(10,8))
-    cc.ang_data.plot.pcolormesh(yincrease = False,
-                                cmap = 'viridis',
-                                norm = plc.Normalize(0,180),
-                                cbar_kwargs={'label': 'Angle, degrees'})
+    mesh = cc.ang_data.plot.pcolormesh(yincrease = False,
+                                       cmap = 'viridis',
+                                       norm = plc.Normalize(0,180),
+                                       cbar_kwargs={'label': 'Angle, degrees'})
     fig.axes[-1].yaxis.label.set_size(20)
-    plt.title(title, fontsize=24)
+    title = plt.title(title, fontsize=24)
     plt.xlabel('Station 1', fontsize=20)
     plt.xticks(rns, stations, rotation=0)
     plt.ylabel('Station 2', fontsize=20)
     plt.yticks(rns, stations, rotation=0)
 
+    # keep hold of the time-varying artists so they can be updated
+    if artists is not None:
+        artists.update(mesh = mesh, title = title)
+
     return fig
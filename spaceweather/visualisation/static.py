@@ -4,8 +4,10 @@ Contents
 
 - csv_to_coords
 - auto_ortho
+- build_globe_scene
 - plot_stations
 - plot_data_globe
+- plot_data_globe_fast
 - plot_connections_globe
 - plot_lag_network
 """
@@ -16,12 +18,14 @@ import numpy as np
 import matplotlib
 import matplotlib.pyplot as plt
 import matplotlib.colors as plc
+from matplotlib.collections import LineCollection
 import pandas as pd
 import xarray as xr # if gives error, just rerun
 import cartopy.crs as ccrs
 import cartopy.feature as cfeature
 from cartopy.feature.nightshade import Nightshade
 import os
+import functools
 import conda
 conda_file_dir = conda.__file__
 conda_dir = conda_file_dir.split('lib')[0]
@@ -37,6 +41,11 @@ from mpl_toolkits.basemap import Basemap
 # I needed it on Windows, even though OpenSSL was already installed
 # https://slproweb.com/products/Win32OpenSSL.html
 
+# figure settings for the globe plots; 'preview' is much quicker to draw and save
+# dpi of None uses matplotlib's default
+GLOBE_QUALITY = {'final': {'figsize': (20, 20), 'dpi': None, 'antialiased': True},
+                 'preview': {'figsize': (6, 6), 'dpi': 72, 'antialiased': False}}
+
 
 
 def csv_to_coords():
@@ -85,11 +94,79 @@ def auto_ortho(list_of_stations):
         Orientation of the plotted globe; determines the angle at which we view the globe.
     '''
 
+    # sorted tuple of names so the result can be cached whatever the input type
+    stations = tuple(sorted(map(str, np.asarray(list_of_stations))))
+
+    return np.array(_auto_ortho_cached(stations))
+
+
+@functools.lru_cache(maxsize=16)
+def _auto_ortho_cached(stations):
+    '''
+    Cached part of :func:`auto_ortho`; stations must be a tuple of station names.
+    '''
+
+    station_coords = csv_to_coords()
+    av_long = float(station_coords.longitude.loc[dict(station = list(stations))].mean())
+    av_lat = float(station_coords.latitude.loc[dict(station = list(stations))].mean())
+
+    return av_long, av_lat
+
+
+def build_globe_scene(ortho_trans, list_of_stations):
+    '''
+    Get the parts of a globe plot that do not change over time, so they can be
+    worked out once and shared between the frames of an animation.
+
+    Parameters
+    ----------
+    ortho_trans : tuple
+        Orientation of the plotted globe; determines at what angle we view the globe.
+    list_of_stations : list
+        List of stations to be used on the plot.
+
+    Returns
+    -------
+    dict
+        The keys are:\n
+        projection: the orthographic projection of the globe,\n
+        station_coords: output of :func:`csv_to_coords`,\n
+        longitude, latitude: numpy.ndarray of the station coordinates, in the
+        order of list_of_stations.
+    '''
+
     station_coords = csv_to_coords()
-    av_long = sum(station_coords.longitude.loc[dict(station = s)] for s in list_of_stations)/len(list_of_stations)
-    av_lat = sum(station_coords.latitude.loc[dict(station = s)] for s in list_of_stations)/len(list_of_stations)
+    stations = dict(station = np.asarray(list_of_stations))
 
-    return np.array((av_long, av_lat))
+    # the land and border geometries, and their projected paths, are already
+    # cached by cartopy for a given projection
+    scene_cache = {'projection': ccrs.Orthographic(ortho_trans[0], ortho_trans[1]), #(long, lat)
+                   'station_coords': station_coords,
+                   'longitude': station_coords.longitude.loc[stations].values,
+                   'latitude': station_coords.latitude.loc[stations].values}
+
+    return scene_cache
+
+
+def _globe_quality(quality):
+    '''
+    Get the figure settings in GLOBE_QUALITY for a quality of globe plot.
+
+    Parameters
+    ----------
+    quality : {'final', 'preview'}
+        Quality of the globe plot.
+
+    Returns
+    -------
+    dict
+        figsize, dpi and antialiased for the globe plot.
+    '''
+
+    if quality not in GLOBE_QUALITY:
+        raise ValueError("Error: quality must be 'final' or 'preview'")
+
+    return GLOBE_QUALITY[quality]
 
 
 def plot_stations(list_of_stations, ortho_trans, sta_col='black', **kwargs):
@@ -105,6 +182,10 @@ def plot_stations(list_of_stations, ortho_trans, sta_col='black', **kwargs):
         Defaults to average location of all stations.
     sta_col : str, optional
         Color for the plotted stations. Default is black.
+    quality : {'final', 'preview'}, optional
+        Passed as a keyword argument. 'preview' draws a smaller, lower
+        resolution globe with aliased coastlines; see GLOBE_QUALITY.
+        Default is 'final'.
 
     Returns
     -------
@@ -113,32 +194,44 @@ def plot_stations(list_of_stations, ortho_trans, sta_col='black', **kwargs):
     '''
 
     # check kwargs
+    q = _globe_quality(kwargs.get('quality', 'final'))
+    scene_cache = kwargs.get('scene_cache', None)
     s_c = kwargs.get('station_coords', None)
     if s_c is not None:
         station_coords = s_c
+    elif scene_cache is not None:
+        station_coords = scene_cache['station_coords']
     else:
         station_coords = csv_to_coords()
     c_l = kwargs.get('sta_col', None)
     if c_l is not None:
         sta_col = c_l
+    if scene_cache is not None:
+        projection = scene_cache['projection']
+    else:
+        projection = ccrs.Orthographic(ortho_trans[0], ortho_trans[1]) #(long, lat)
 
     # initialize plot of globe with features
-    fig = plt.figure(figsize = (20, 20))
-    ax = fig.add_subplot(1, 1, 1, projection=ccrs.Orthographic(ortho_trans[0], ortho_trans[1])) #(long, lat)
+    fig = plt.figure(figsize = q['figsize'], dpi = q['dpi'])
+    ax = fig.add_subplot(1, 1, 1, projection=projection)
     ax.add_feature(cfeature.OCEAN, zorder=0)
-    ax.add_feature(cfeature.LAND, zorder=0, edgecolor='grey')
-    ax.add_feature(cfeature.BORDERS, zorder=0, edgecolor='grey')
+    ax.add_feature(cfeature.LAND, zorder=0, edgecolor='grey', antialiased=q['antialiased'])
+    ax.add_feature(cfeature.BORDERS, zorder=0, edgecolor='grey', antialiased=q['antialiased'])
     ax.add_feature(cfeature.LAKES, zorder=0)
     ax.set_global()
     ax.gridlines()
 
     # get latitudes and longitudes of stations
-    num_sta = len(list_of_stations)
-    longs = np.zeros(num_sta)
-    lats = np.zeros(num_sta)
-    for i in range(num_sta):
-        longs[i] = station_coords.longitude.loc[dict(station = list_of_stations[i])]
-        lats[i] = station_coords.latitude.loc[dict(station = list_of_stations[i])]
+    if scene_cache is not None:
+        longs = scene_cache['longitude']
+        lats = scene_cache['latitude']
+    else:
+        num_sta = len(list_of_stations)
+        longs = np.zeros(num_sta)
+        lats = np.zeros(num_sta)
+        for i in range(num_sta):
+            longs[i] = station_coords.longitude.loc[dict(station = list_of_stations[i])]
+            lats[i] = station_coords.latitude.loc[dict(station = list_of_stations[i])]
 
     # add stations to plot
     ax.scatter(longs, lats, transform = ccrs.Geodetic(), c = sta_col)
@@ -147,7 +240,9 @@ def plot_stations(list_of_stations, ortho_trans, sta_col='black', **kwargs):
 
 
 def plot_data_globe(ds, list_of_stations=None, list_of_components=['N', 'E'],
-                     t=0, ortho_trans=None, daynight=True, colour=False, **kwargs):
+                     t=0, ortho_trans=None, daynight=True, colour=False,
+                     quality='final', scene_cache=None, ax=None, artists=None,
+                     **kwargs):
     '''
     Plot the data as vectors for each station on a globe for a single time
     with an optional shadow for nighttime and optional data colouration.
@@ -173,6 +268,18 @@ def plot_data_globe(ds, list_of_stations=None, list_of_components=['N', 'E'],
     colour : bool, optional
         Whether or not to colour the data vectors. Also accepts 'color' for
         Americans who can't spell properly.
+    quality : {'final', 'preview'}, optional
+        'preview' draws a smaller, lower resolution globe with aliased
+        coastlines; see GLOBE_QUALITY. Default is 'final'.
+    scene_cache : dict, optional
+        Output of :func:`build_globe_scene` for ortho_trans and list_of_stations;
+        saves working out the projection and station coordinates again.
+    ax : cartopy.mpl.geoaxes.GeoAxes, optional
+        Axes of an earlier plot from this function to update with the data at t,
+        rather than making a new figure. Must be given with the artists of that plot.
+    artists : dict, optional
+        The time-varying artists of the plot. If empty then it is filled with
+        the artists of the new plot, ready to be updated by a later call with ax.
 
     Returns
     -------
@@ -191,18 +298,16 @@ def plot_data_globe(ds, list_of_stations=None, list_of_components=['N', 'E'],
         return 'Error: please input two components in list_of_components'
     if list_of_stations is None:
         list_of_stations = ds.station.values
-    if ortho_trans is None:
-        ortho_trans = auto_ortho(list_of_stations)
+    if scene_cache is None:
+        if ortho_trans is None:
+            ortho_trans = auto_ortho(list_of_stations)
+        scene_cache = build_globe_scene(ortho_trans, list_of_stations)
     if isinstance(t, int):
         t = ds[dict(time = t)].time.values # extract time at t
 
-    # get constants
-    station_coords = csv_to_coords()
-    num_stations = len(list_of_stations)
-
     # store latitude and longitude of the stations
-    x = station_coords.longitude.loc[dict(station = list_of_stations)].values
-    y = station_coords.latitude.loc[dict(station = list_of_stations)].values
+    x = scene_cache['longitude']
+    y = scene_cache['latitude']
 
     # store measurements for each coordinate
     u = ds.measurements.loc[dict(time = t,
@@ -212,12 +317,100 @@ def plot_data_globe(ds, list_of_stations=None, list_of_components=['N', 'E'],
                                  station = list_of_stations,
                                  component = list_of_components[0])].values
 
+    return plot_data_globe_fast(y, x, v, u, t,
+                                ortho_trans = ortho_trans,
+                                daynight = daynight,
+                                colour = colour,
+                                quality = quality,
+                                scene_cache = scene_cache,
+                                ax = ax,
+                                artists = artists)
+
+
+def plot_data_globe_fast(lats, longs, v, u, t, ortho_trans=None, daynight=True,
+                         colour=False, quality='final', scene_cache=None,
+                         ax=None, artists=None, **kwargs):
+    '''
+    Plot data vectors on a globe for a single time, as in :func:`plot_data_globe`,
+    but from plain arrays rather than a Dataset; used for animations, where the
+    arrays can be taken out of the Dataset once for every frame.
+
+    Parameters
+    ----------
+    lats, longs : numpy.ndarray
+        Latitude and longitude of each station.
+    v : numpy.ndarray
+        Measurements of the first component for each station; plotted northwards.
+    u : numpy.ndarray
+        Measurements of the second component for each station; plotted eastwards.
+    t : numpy.datetime64
+        The time of the measurements.
+    ortho_trans : tuple, optional
+        Orientation of the plotted globe; determines at what angle we view the globe.
+        Defaults to average location of all stations.
+    daynight : bool, optional
+        Whether or not to include a shadow for nighttime. Default is True.
+    colour : bool, optional
+        Whether or not to colour the data vectors. Also accepts 'color' for
+        Americans who can't spell properly.
+    quality : {'final', 'preview'}, optional
+        'preview' draws a smaller, lower resolution globe with aliased
+        coastlines; see GLOBE_QUALITY. Default is 'final'.
+    scene_cache : dict, optional
+        Output of :func:`build_globe_scene`; only its projection is used.
+    ax : cartopy.mpl.geoaxes.GeoAxes, optional
+        Axes of an earlier plot from this function to update with the data at t,
+        rather than making a new figure. Must be given with the artists of that plot.
+    artists : dict, optional
+        The time-varying artists of the plot. If empty then it is filled with
+        the artists of the new plot, ready to be updated by a later call with ax.
+
+    Returns
+    -------
+    matplotlib.figure.Figure
+        Plot of the network on the globe.
+    '''
+
+    # check kwargs for color
+    cl = kwargs.get('color', None)
+    if cl is not None:
+        colour = cl
+
+    # check inputs
+    if scene_cache is None:
+        if ortho_trans is None:
+            ortho_trans = (np.mean(longs), np.mean(lats))
+        scene_cache = {'projection': ccrs.Orthographic(ortho_trans[0], ortho_trans[1])} #(long, lat)
+
+    # get constants
+    num_stations = len(longs)
+    x = longs
+    y = lats
+
+    dt = pd.to_datetime(t)
+    mytime = dt.strftime('%Y.%m.%d %H:%M')
+
+    # update the time-varying artists of an existing plot
+    if ax is not None and artists:
+        # cartopy transforms the vectors when quiver() is called, not on
+        # set_UVC, so transform them here
+        u, v = ax.projection.transform_vectors(ccrs.PlateCarree(), x, y, u, v)
+        # let matplotlib autoscale the arrows for this time, as a new plot would
+        artists['quiver'].scale = None
+        artists['quiver'].set_UVC(u, v)
+        if daynight:
+            artists['nightshade'].remove()
+            artists['nightshade'] = ax.add_feature(Nightshade(dt), alpha = 0.2)
+        artists['title'].set_text("%s" %mytime)
+        return ax.figure
+
     # create figure
-    fig = plt.figure(figsize = (20, 20))
-    ax = fig.add_subplot(1, 1, 1, projection=ccrs.Orthographic(ortho_trans[0], ortho_trans[1])) #(long, lat)
+    q = _globe_quality(quality)
+    fig = plt.figure(figsize = q['figsize'], dpi = q['dpi'])
+    ax = fig.add_subplot(1, 1, 1, projection=scene_cache['projection'])
     ax.add_feature(cfeature.OCEAN, zorder=0)
-    ax.add_feature(cfeature.LAND, zorder=0, edgecolor='grey')
-    ax.add_feature(cfeature.BORDERS, zorder=0, edgecolor='grey')
+    ax.add_feature(cfeature.LAND, zorder=0, edgecolor='grey', antialiased=q['antialiased'])
+    ax.add_feature(cfeature.BORDERS, zorder=0, edgecolor='grey', antialiased=q['antialiased'])
     ax.add_feature(cfeature.LAKES, zorder=0)
     ax.set_global()
     ax.gridlines()
@@ -229,26 +422,57 @@ def plot_data_globe(ds, list_of_stations=None, list_of_components=['N', 'E'],
         colours[:, 0] = x/360
         colours[:, 2] = (y-10)/80
         colours = plc.hsv_to_rgb(colours)
-        ax.quiver(x, y, u, v, transform = ccrs.PlateCarree(), #plots vector data
-              width = 0.002, color = colours)
+        quiver = ax.quiver(x, y, u, v, transform = ccrs.PlateCarree(), #plots vector data
+                           width = 0.002, color = colours)
     else:
-        ax.quiver(x, y, u, v, transform = ccrs.PlateCarree(), #plots vector data
-                  width = 0.002, color = "g")
+        quiver = ax.quiver(x, y, u, v, transform = ccrs.PlateCarree(), #plots vector data
+                           width = 0.002, color = "g")
 
     # add shadow for nighttime
+    nightshade = None
     if daynight:
-        ax.add_feature(Nightshade(pd.to_datetime(t)), alpha = 0.2)
+        nightshade = ax.add_feature(Nightshade(dt), alpha = 0.2)
 
     # add timestamp as plot title
-    dt = pd.to_datetime(t)
-    mytime = dt.strftime('%Y.%m.%d %H:%M')
-    plt.title("%s" %mytime, fontsize = 30)
+    title = plt.title("%s" %mytime, fontsize = 30)
+
+    # keep hold of the time-varying artists so they can be updated
+    if artists is not None:
+        artists.update(quiver = quiver, nightshade = nightshade, title = title)
 
     return fig
 
 
+def _edges_from_adj(adj_matrix, lats, longs):
+    '''
+    Get the end points of the connections between each station pair.
+
+    Parameters
+    ----------
+    adj_matrix : numpy.ndarray
+        The adjacency matrix for the connections between stations; only the
+        upper triangle is used.
+    lats, longs : numpy.ndarray
+        Latitude and longitude of each station, in the order of adj_matrix.
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (number of connections, 2, 2) holding the (long, lat)
+        of both ends of each connection.
+    '''
+
+    # indices of the connected pairs, in the same order as looping over i < j
+    first, second = np.nonzero(np.triu(np.asarray(adj_matrix) == 1, k = 1))
+    starts = np.column_stack((longs[first], lats[first]))
+    ends = np.column_stack((longs[second], lats[second]))
+
+    return np.stack((starts, ends), axis = 1)
+
+
 def plot_connections_globe(adj_matrix, ds=None, list_of_stations=None, time=None,
-                           ortho_trans=None, daynight=True, **kwargs):
+                           ortho_trans=None, daynight=True, quality='final',
+                           scene_cache=None, ax=None, artists=None, **kwargs):
     '''
     Plot the network on a globe for a single time with an optional shadow for nighttime.
 
@@ -271,6 +495,18 @@ def plot_connections_globe(adj_matrix, ds=None, list_of_stations=None, time=None
         Defaults to average location of all stations.
     daynight : bool, optional
         Whether or not to include a shadow for nighttime. Default is True.
+    quality : {'final', 'preview'}, optional
+        'preview' draws a smaller, lower resolution globe with aliased
+        coastlines; see GLOBE_QUALITY. Default is 'final'.
+    scene_cache : dict, optional
+        Output of :func:`build_globe_scene` for ortho_trans and list_of_stations;
+        saves working out the projection and station coordinates again.
+    ax : cartopy.mpl.geoaxes.GeoAxes, optional
+        Axes of an earlier plot from this function to update with adj_matrix,
+        rather than making a new figure. Must be given with the artists of that plot.
+    artists : dict, optional
+        The time-varying artists of the plot. If empty then it is filled with
+        the artists of the new plot, ready to be updated by a later call with ax.
 
     Returns
     -------
@@ -289,38 +525,49 @@ def plot_connections_globe(adj_matrix, ds=None, list_of_stations=None, time=None
         time = pd.to_datetime(ds.time.values[0])
     time = pd.to_datetime(time)
 
-    if ortho_trans is None:
-        ortho_trans = auto_ortho(list_of_stations)
+    if scene_cache is None:
+        if ortho_trans is None:
+            ortho_trans = auto_ortho(list_of_stations)
+        scene_cache = build_globe_scene(ortho_trans, list_of_stations)
 
     # get constants
-    num_sta = len(list_of_stations)
-    station_coords = csv_to_coords()
+    longs = scene_cache['longitude']
+    lats = scene_cache['latitude']
+
+    # if connected, get the connection between each station pair
+    segments = _edges_from_adj(adj_matrix, lats, longs)
+
+    mytime = time.strftime('%Y.%m.%d %H:%M')
+
+    # update the time-varying artists of an existing plot
+    if ax is not None and artists:
+        artists['edges'].set_segments(segments)
+        if daynight:
+            artists['nightshade'].remove()
+            artists['nightshade'] = ax.add_feature(Nightshade(time), alpha = 0.2)
+        artists['title'].set_text("%s" %mytime)
+        return ax.figure
 
     # initialize plot
-    fig = plot_stations(list_of_stations, ortho_trans,
-                        station_coords = station_coords, **kwargs)
+    fig = plot_stations(list_of_stations, ortho_trans, quality = quality,
+                        scene_cache = scene_cache, **kwargs)
     ax = fig.axes[0]
 
-    # if connected, plot the connection between each station pair
-    for i in range(num_sta-1):
-        for j in range(i+1, num_sta):
-            if adj_matrix[i, j] == 1:
-                station_i = list_of_stations[i]
-                station_j = list_of_stations[j]
-                long1 = station_coords.longitude.loc[dict(station = station_i)]
-                long2 = station_coords.longitude.loc[dict(station = station_j)]
-                lat1 = station_coords.latitude.loc[dict(station = station_i)]
-                lat2 = station_coords.latitude.loc[dict(station = station_j)]
-
-                ax.plot([long1, long2], [lat1, lat2], color='blue', transform=ccrs.Geodetic())
+    # plot all the connections as one collection
+    edges = LineCollection(segments, colors = 'blue', transform = ccrs.Geodetic())
+    ax.add_collection(edges, autolim = False)
 
     # add shadow for nighttime
+    nightshade = None
     if daynight:
-        ax.add_feature(Nightshade(time), alpha = 0.2)
+        nightshade = ax.add_feature(Nightshade(time), alpha = 0.2)
 
     # add timestamp as plot title
-    mytime = time.strftime('%Y.%m.%d %H:%M')
-    plt.title("%s" %mytime, fontsize = 30)
+    title = plt.title("%s" %mytime, fontsize = 30)
+
+    # keep hold of the time-varying artists so they can be updated
+    if artists is not None:
+        artists.update(edges = edges, nightshade = nightshade, title = title)
 
     return fig
 
@@ -353,7 +600,6 @@ def plot_lag_network(adj_matrix, lag_range=10, ortho_trans=None,
     # constants
     time = pd.to_datetime(adj_matrix.win_start.values)
     list_of_sta = adj_matrix.first_st
-    num_sta = len(list_of_sta)
     sta_coords = csv_to_coords()
     if ortho_trans is None:
         ortho_trans = auto_ortho(list_of_sta)
@@ -369,41 +615,28 @@ def plot_lag_network(adj_matrix, lag_range=10, ortho_trans=None,
     map.drawparallels(np.arange(-90,90,30), color='darkgrey', zorder=0)
 
     # get lon/lat data for each station
-    lons = np.zeros(num_sta)
-    lats = np.zeros(num_sta)
-    for i in range(num_sta):
-        lons[i] = sta_coords.longitude.loc[dict(station = list_of_sta[i])]
-        lats[i] = sta_coords.latitude.loc[dict(station = list_of_sta[i])]
+    stations = dict(station = np.asarray(list_of_sta))
+    lons = sta_coords.longitude.loc[stations].values
+    lats = sta_coords.latitude.loc[stations].values
 
     # draw stations on map
     lons, lats = map(lons, lats)
     map.scatter(lons, lats, color=sta_color)
 
     # if connected, get the lag between each station pair
-    x = []
-    y = []
-    u = []
-    v = []
-    lags = []
-    for i in range(num_sta-1):
-        for j in range(i+1, num_sta):
-            a_m = adj_matrix[dict(first_st = i, second_st = j)]
-            if a_m.adj_coeffs.values == 1:
-                lg = a_m.lag.values
-                if lg < 0:
-                    # append to scatter lists
-                    x.append(lons[j])
-                    y.append(lats[j])
-                    u.append(lons[i]-lons[j])
-                    v.append(lats[i]-lats[j])
-                    lags.append(-lg)
-                else:
-                    # append to scatter lists
-                    x.append(lons[i])
-                    y.append(lats[i])
-                    u.append(lons[j]-lons[i])
-                    v.append(lats[j]-lats[i])
-                    lags.append(lg)
+    adj_coeffs = adj_matrix.adj_coeffs.transpose('first_st', 'second_st').values
+    lag = adj_matrix.lag.transpose('first_st', 'second_st').values
+    first, second = np.nonzero(np.triu(adj_coeffs == 1, k = 1))
+    lg = lag[first, second]
+
+    # arrows point from the leading station to the lagging one
+    start = np.where(lg < 0, second, first)
+    end = np.where(lg < 0, first, second)
+    x = lons[start]
+    y = lats[start]
+    u = lons[end]-lons[start]
+    v = lats[end]-lats[start]
+    lags = np.abs(lg)
 
     # plot the lag arrows on map
     norm = plc.Normalize(0, lag_range)